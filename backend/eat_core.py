@@ -6,18 +6,41 @@ from __future__ import annotations
 
 import os
 import subprocess
-from typing import Any, Dict, Optional, Tuple
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 import numpy as np
 import nibabel as nib
 
+try:
+    import numba
+except ImportError:  # optional: compiled kernel for the EAT statistics
+    numba = None
 
-def run_totalsegmentation(ct_path: str, out_dir: str, device: str = "cpu") -> tuple[str, Optional[str]]:
+try:
+    import cupy
+except ImportError:  # optional: GPU EAT statistics for device="gpu"/"cuda"
+    cupy = None
+
+# Axial slices read per slab when streaming a volume through compute_eat_and_stats.
+# Must stay a multiple of 8 so slabs line up with the packed pericardium bytes.
+_Z_TILE_SLICES = 32
+
+
+def set_num_threads(num_threads: int) -> None:
+    """Cap the threads used by the parallel numba kernel (no-op without numba)."""
+    if numba is not None:
+        numba.set_num_threads(max(1, min(int(num_threads), numba.config.NUMBA_NUM_THREADS)))
+
+
+def run_totalsegmentation(
+    ct_path: str, out_dir: str, device: str = "cpu", num_threads: int = 1
+) -> tuple[str, Optional[str]]:
     """Run TotalSegmentator to produce pericardium mask and (optionally) myocardium mask.
 
     Returns a tuple `(pericardium_path, myocardium_path_or_none)`.
     If pericardium already exists, skips running. Myocardium path is detected
     by looking for files with 'myocardium' in the filename in the output directory.
+    `num_threads` sets OMP_NUM_THREADS for the TotalSegmentator process.
     """
     pericardium_path = os.path.join(out_dir, "pericardium.nii.gz")
     myocardium_path: Optional[str] = None
@@ -42,7 +65,7 @@ def run_totalsegmentation(ct_path: str, out_dir: str, device: str = "cpu") -> tu
 
     env = os.environ.copy()
     env["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-    env["OMP_NUM_THREADS"] = "1"
+    env["OMP_NUM_THREADS"] = str(max(1, int(num_threads)))
 
     try:
         subprocess.run(cmd, check=True, env=env)
@@ -71,36 +94,54 @@ def compute_eat_and_stats(
     high_hu: float,
     *,
     return_arrays: bool = True,
+    return_eat_mask: bool = False,
+    device: str = "cpu",
 ) -> Dict[str, Any]:
-    """Compute EAT mask and stats from CT + pericardium mask."""
-    ct_img = nib.load(ct_path)
-    ct_data = ct_img.get_fdata()
-    peri_img = nib.load(pericardium_path)
-    peri_data = peri_img.get_fdata()
-
-    if ct_data.ndim != 3:
-        raise ValueError("CT data must be 3D. Got shape {}".format(ct_data.shape))
-
-    if peri_data.shape != ct_data.shape:
-        raise ValueError(
-            "Mask shape {} does not match CT shape {}.".format(
-                peri_data.shape, ct_data.shape
+    """Compute EAT mask and stats from CT + pericardium mask.
+
+    Only the bounding box of the pericardium is read from the CT, streamed in
+    slabs of `_Z_TILE_SLICES` axial slices; just the voxel count, sum and sum
+    of squares are carried between slabs. The full pericardium mask is still
+    loaded once to find that box, so peak memory is the pericardium volume
+    while it is cropped and bit-packed, then the packed crop plus one CT slab.
+    With `return_arrays` the whole volume is read as a single slab so the
+    full arrays can be returned. With `return_eat_mask` the mask is also
+    assembled as a full uint8 volume (`eat_mask_uint8`) for
+    `save_eat_mask_nifti`, so saving it needs no second pass; that volume is
+    held for the whole call on top of the above. The opened CT is always
+    returned as `ct_img` so callers can reuse it without reloading.
+    For a GPU `device` the per-slab thresholding and reductions run on the GPU
+    when CuPy is installed; only the scalars (and the optional mask) are copied
+    back.
+    """
+    ct_img, peri_img = _load_ct_and_pericardium(ct_path, pericardium_path)
+    nz = int(ct_img.shape[2])
+    use_gpu = not return_arrays and _gpu_available(device)
+
+    eat_data = np.zeros(ct_img.shape, dtype=np.uint8) if return_eat_mask else None
+    count, total, total_sq = 0, 0.0, 0.0
+    for region, ct_data, peri_data, low, high in _iter_eat_slabs(
+        ct_img, np.asanyarray(peri_img.dataobj), low_hu, high_hu, whole_volume=return_arrays
+    ):
+        if use_gpu:
+            slab_count, slab_total, slab_total_sq = _eat_moments_gpu(
+                ct_data, peri_data, low, high, None if eat_data is None else eat_data[region]
             )
-        )
-
-    pericardium_mask = peri_data > 0
-    eat_mask = np.logical_and(
-        pericardium_mask,
-        np.logical_and(ct_data >= low_hu, ct_data <= high_hu),
-    )
+        elif return_arrays or eat_data is not None or _eat_moments_kernel is None:
+            eat_mask = _eat_mask(ct_data, peri_data, low, high)
+            if eat_data is not None:
+                eat_data[region] = eat_mask.view(np.uint8)
+            slab_count, slab_total, slab_total_sq = _hu_moments(ct_data[eat_mask])
+        else:
+            slab_count, slab_total, slab_total_sq = _eat_moments_kernel(ct_data, peri_data, low, high)
+        count += slab_count
+        total += slab_total
+        total_sq += slab_total_sq
+    mean_hu, std_hu = _mean_std(count, total, total_sq)
 
     zooms = tuple(float(z) for z in ct_img.header.get_zooms())
     voxel_volume_ml = float(np.prod(zooms) / 1000.0)
-    eat_volume = float(np.sum(eat_mask) * voxel_volume_ml)
-
-    eat_values = ct_data[eat_mask]
-    mean_hu = float(eat_values.mean()) if eat_values.size else 0.0
-    std_hu = float(eat_values.std()) if eat_values.size else 0.0
+    eat_volume = float(count * voxel_volume_ml)
 
     results: Dict[str, Any] = {
         "eat_volume": eat_volume,
@@ -108,19 +149,27 @@ def compute_eat_and_stats(
         "std_hu": std_hu,
         "voxel_volume_ml": voxel_volume_ml,
         "zooms": zooms,
-        "total_slices": int(ct_data.shape[2]),
-        "mid_slice": int(ct_data.shape[2] // 2),
+        "total_slices": nz,
+        "mid_slice": nz // 2,
+        "ct_img": ct_img,
     }
 
     if return_arrays:
         results["ct_data"] = ct_data
-        results["pericardium_mask"] = pericardium_mask
+        results["pericardium_mask"] = peri_data > 0
         results["eat_mask"] = eat_mask
+    if return_eat_mask:
+        results["eat_mask_uint8"] = eat_data
     return results
 
 
 def run_totalsegmentation_task(
-    ct_path: str, out_dir: str, task: str, device: str = "cpu", label_hint: str = "myocardium"
+    ct_path: str,
+    out_dir: str,
+    task: str,
+    device: str = "cpu",
+    label_hint: str = "myocardium",
+    num_threads: int = 1,
 ) -> Optional[str]:
     """Run TotalSegmentator for a specific `task` into `out_dir/task` and
     return the first file matching `label_hint` (case-insensitive), or None.
@@ -150,7 +199,7 @@ def run_totalsegmentation_task(
 
     env = os.environ.copy()
     env["KMP_DUPLICATE_LIB_OK"] = "TRUE"
-    env["OMP_NUM_THREADS"] = "1"
+    env["OMP_NUM_THREADS"] = str(max(1, int(num_threads)))
 
     try:
         subprocess.run(cmd, check=True, env=env)
@@ -172,9 +221,9 @@ def compute_myocardium_ff(ct_path: str, myocardium_path: Optional[str], low_hu:
     if not myocardium_path:
         return None
     try:
-        ct_img = nib.load(ct_path)
+        ct_img = nib.load(ct_path, mmap=False)
         ct_data = ct_img.get_fdata()
-        myo_img = nib.load(myocardium_path)
+        myo_img = nib.load(myocardium_path, mmap=False)
         myo_data = myo_img.get_fdata()
     except Exception:
         return None
@@ -200,38 +249,30 @@ def _format_hu_for_filename(value: float) -> str:
 
 def save_eat_mask_nifti(
     out_dir: str,
-    ct_path: str,
-    pericardium_path: str,
+    ct_img: nib.Nifti1Image,
+    eat_mask: np.ndarray,
     low_hu: float,
     high_hu: float,
 ) -> str:
-    """Save EAT mask as NIfTI using CT affine/header for alignment."""
-    os.makedirs(out_dir, exist_ok=True)
+    """Save an EAT mask as NIfTI using the CT affine/header for alignment.
 
-    ct_img = nib.load(ct_path)
-    ct_data = ct_img.get_fdata()
-    peri_img = nib.load(pericardium_path)
-    peri_data = peri_img.get_fdata()
-
-    if ct_data.ndim != 3:
-        raise ValueError("CT data must be 3D. Got shape {}".format(ct_data.shape))
+    `eat_mask` is the full-volume mask, e.g. `eat_mask_uint8` from
+    `compute_eat_and_stats(..., return_eat_mask=True)`; uint8 input is
+    written without a copy.
+    """
+    os.makedirs(out_dir, exist_ok=True)
 
-    if peri_data.shape != ct_data.shape:
+    eat_data = np.asarray(eat_mask, dtype=np.uint8)
+    if eat_data.shape != ct_img.shape:
         raise ValueError(
             "Mask shape {} does not match CT shape {}.".format(
-                peri_data.shape, ct_data.shape
+                eat_data.shape, ct_img.shape
             )
         )
 
-    pericardium_mask = peri_data > 0
-    eat_mask = np.logical_and(
-        pericardium_mask,
-        np.logical_and(ct_data >= low_hu, ct_data <= high_hu),
-    )
-
     header = ct_img.header.copy()
     header.set_data_dtype(np.uint8)
-    mask_img = nib.Nifti1Image(eat_mask.astype(np.uint8), ct_img.affine, header=header)
+    mask_img = nib.Nifti1Image(eat_data, ct_img.affine, header=header)
 
     qform, qcode = ct_img.header.get_qform(coded=True)
     sform, scode = ct_img.header.get_sform(coded=True)
@@ -281,7 +322,202 @@ def save_stats_csv(
     return stats_csv
 
 
+def _load_ct_and_pericardium(ct_path: str, pericardium_path: str) -> Tuple[Any, Any]:
+    """Open the CT and pericardium images and check that their shapes match.
+
+    Images are opened with `mmap=False`: slab reads of uncompressed `.nii`
+    files then become plain contiguous reads rather than page faults through
+    a memory map, at the cost of each slab being copied into memory.
+    """
+    ct_img = nib.load(ct_path, mmap=False)
+    peri_img = nib.load(pericardium_path, mmap=False)
+
+    if len(ct_img.shape) != 3:
+        raise ValueError("CT data must be 3D. Got shape {}".format(ct_img.shape))
+
+    if peri_img.shape != ct_img.shape:
+        raise ValueError(
+            "Mask shape {} does not match CT shape {}.".format(
+                peri_img.shape, ct_img.shape
+            )
+        )
+    return ct_img, peri_img
+
+
+def _iter_eat_slabs(
+    ct_img: Any,
+    peri_volume: np.ndarray,
+    low_hu: float,
+    high_hu: float,
+    *,
+    whole_volume: bool = False,
+) -> Iterator[Tuple[Tuple[slice, slice, slice], np.ndarray, np.ndarray, Any, Any]]:
+    """Yield `(region, ct_data, peri_data, low, high)` for each CT slab.
+
+    Only the bounding box of `peri_volume` is visited, in slabs of
+    `_Z_TILE_SLICES` axial slices, and slabs without pericardium are skipped.
+    `region` indexes the slab within the full volume and `low`/`high` are the
+    HU window in the slab's dtype. With `whole_volume` the entire volume is
+    yielded as a single slab.
+    """
+    if whole_volume:
+        bbox: Optional[Tuple[slice, slice, slice]] = tuple(slice(0, n) for n in peri_volume.shape)
+        step = max(peri_volume.shape[2], 1)
+    else:
+        bbox = _mask_bbox(peri_volume)
+        step = _Z_TILE_SLICES
+    if bbox is None:
+        return
+
+    x_range, y_range, z_range = bbox
+    # Hold the cropped pericardium as a 1 bit/voxel bitmap packed along z.
+    # Slabs start at multiples of 8 slices from the crop, so each one
+    # unpacks from whole bytes.
+    peri_bits = np.packbits(peri_volume[x_range, y_range, z_range] > 0, axis=2)
+    del peri_volume
+    for z0 in range(z_range.start, z_range.stop, step):
+        z1 = min(z0 + step, z_range.stop)
+        b0 = (z0 - z_range.start) // 8
+        b1 = (z1 - z_range.start + 7) // 8
+        peri_data = np.unpackbits(peri_bits[:, :, b0:b1], axis=2, count=z1 - z0).view(bool)
+        if not whole_volume and not peri_data.any():
+            continue
+        ct_data = np.asanyarray(ct_img.dataobj[x_range, y_range, z0:z1])
+        low, high = _hu_window(low_hu, high_hu, ct_data.dtype)
+        yield (x_range, y_range, slice(z0, z1)), ct_data, peri_data, low, high
+
+
+def _mask_bbox(mask: np.ndarray) -> Optional[Tuple[slice, slice, slice]]:
+    """Return the bounding box of the nonzero voxels of a 3D `mask` as slices,
+    or None if the mask is empty.
+    """
+    xz_any = mask.any(axis=1)
+    if not xz_any.any():
+        return None
+    bbox = []
+    for axis_any in (xz_any.any(axis=1), mask.any(axis=(0, 2)), xz_any.any(axis=0)):
+        indices = np.flatnonzero(axis_any)
+        bbox.append(slice(int(indices[0]), int(indices[-1]) + 1))
+    return bbox[0], bbox[1], bbox[2]
+
+
+def _hu_window(low_hu: float, high_hu: float, dtype: np.dtype) -> Tuple[Any, Any]:
+    """Express an inclusive HU window as bounds of `dtype`.
+
+    For integer dtypes the bounds are rounded inwards and clipped to the dtype
+    range so the comparison can run directly on the stored integers.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.kind not in "iu":
+        return low_hu, high_hu
+
+    info = np.iinfo(dtype)
+    low = int(np.ceil(low_hu))
+    high = int(np.floor(high_hu))
+    if low > info.max or high < info.min or low > high:
+        # Empty window; any lo > hi pair inside the dtype range works.
+        return dtype.type(1), dtype.type(0)
+    return dtype.type(max(low, info.min)), dtype.type(min(high, info.max))
+
+
+def _eat_mask(ct_data: np.ndarray, peri_data: np.ndarray, low: Any, high: Any) -> np.ndarray:
+    """Return `(peri > 0) & (low <= ct <= high)` using one scratch buffer.
+
+    Each comparison is written into a reused bool array and folded into the
+    result in place, instead of allocating a temporary per operator.
+    """
+    eat_mask = np.greater_equal(ct_data, low)
+    scratch = np.less_equal(ct_data, high)
+    eat_mask &= scratch
+    np.greater(peri_data, 0, out=scratch)
+    eat_mask &= scratch
+    return eat_mask
+
+
+def _hu_moments(values: np.ndarray) -> Tuple[int, float, float]:
+    """Return `(count, sum, sum_of_squares)` of `values`, accumulated in float64.
+
+    Both sums widen to float64 inside the reduction, so the (int16) values are
+    never copied into a float64 array first.
+    """
+    total = np.add.reduce(values, axis=None, dtype=np.float64)
+    total_sq = np.einsum("i,i->", values.ravel(), values.ravel(), dtype=np.float64)
+    return int(values.size), float(total), float(total_sq)
+
+
+if numba is not None:
+
+    @numba.njit(parallel=True, fastmath=True, cache=True)
+    def _eat_moments_kernel(ct_data, peri_data, low, high):
+        """Fused `(count, sum, sum_of_squares)` of CT voxels inside the EAT mask.
+
+        Walks the slab once without building the mask. The x index runs
+        innermost to match nibabel's Fortran-ordered arrays.
+        """
+        nx, ny, nz = ct_data.shape
+        count = 0
+        total = 0.0
+        total_sq = 0.0
+        for k in numba.prange(nz):
+            for j in range(ny):
+                for i in range(nx):
+                    value = ct_data[i, j, k]
+                    if peri_data[i, j, k] and value >= low and value <= high:
+                        count += 1
+                        total += float(value)
+                        total_sq += float(value) * float(value)
+        return count, total, total_sq
+
+else:
+    _eat_moments_kernel = None
+
+
+def _gpu_available(device: str) -> bool:
+    """True if `device` names a GPU ("gpu", "cuda", "gpu:1", ...) and CuPy can use one."""
+    if cupy is None or device.split(":", 1)[0].lower() not in ("gpu", "cuda"):
+        return False
+    try:
+        return cupy.cuda.runtime.getDeviceCount() > 0
+    except Exception:
+        return False
+
+
+def _eat_moments_gpu(
+    ct_data: np.ndarray,
+    peri_data: np.ndarray,
+    low: Any,
+    high: Any,
+    mask_out: Optional[np.ndarray] = None,
+) -> Tuple[int, float, float]:
+    """CuPy version of `(count, sum, sum_of_squares)` for one slab.
+
+    If `mask_out` is given the slab's EAT mask is copied into it (as 0/1).
+    """
+    ct_gpu = cupy.asarray(ct_data)
+    eat_mask = (ct_gpu >= low) & (ct_gpu <= high) & cupy.asarray(peri_data)
+    values = ct_gpu[eat_mask].astype(cupy.float64)
+    if mask_out is not None:
+        mask_out[...] = cupy.asnumpy(eat_mask)
+    return int(values.size), float(values.sum()), float(cupy.dot(values, values))
+
+
+def _mean_std(count: int, total: float, total_sq: float) -> Tuple[float, float]:
+    """Turn accumulated moments into mean and (population) standard deviation."""
+    if count == 0:
+        return 0.0, 0.0
+    mean = total / count
+    var = max(total_sq / count - mean * mean, 0.0)
+    return float(mean), float(np.sqrt(var))
+
+
 def _find_pericardium(out_dir: str) -> Optional[str]:
+    # TotalSegmentator writes either straight into out_dir or into segmentations/.
+    for candidate in (
+        os.path.join(out_dir, "pericardium.nii.gz"),
+        os.path.join(out_dir, "segmentations", "pericardium.nii.gz"),
+    ):
+        if os.path.isfile(candidate):
+            return candidate
     for root, _, files in os.walk(out_dir):
         for filename in files:
             if filename.lower() == "pericardium.nii.gz":
@@ -1,17 +1,24 @@
 from __future__ import annotations
 
 from pathlib import Path
+import asyncio
 import base64
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 import csv
 import json
+import multiprocessing
+import os
 import re
 from datetime import datetime, timezone
 import shutil
+import threading
 from io import BytesIO
 from typing import Optional
 from uuid import uuid4
 
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile
+from fastapi import FastAPI, File, Form, HTTPException, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
 import numpy as np
 import nibabel as nib
@@ -22,6 +29,7 @@ from backend.eat_core import (
     run_totalsegmentation,
     save_eat_mask_nifti,
     save_stats_csv,
+    set_num_threads,
 )
 from backend.eat_core import (
     run_totalsegmentation_task,
@@ -31,7 +39,51 @@ from backend.eat_core import (
 
 BASE_DIR = Path(__file__).resolve().parent
 DEFAULT_OUTPUT_DIR = BASE_DIR / "output"
-ANALYSIS_CACHE: dict[str, dict[str, object]] = {}
+# Analyses available to /api/slice, most recently used last. Bounded so a
+# long-running server does not accumulate an entry per analysis forever.
+ANALYSIS_CACHE_LIMIT = 256
+ANALYSIS_CACHE: OrderedDict[str, dict[str, object]] = OrderedDict()
+# Opened nibabel images per analysis, most recently used last. Images only hold
+# the header and a lazy dataobj proxy (opened with mmap=False, so each slice is
+# a plain file read), so slice reads stay cheap.
+IMAGE_CACHE_LIMIT = 32
+IMAGE_CACHE: OrderedDict[str, dict[str, object]] = OrderedDict()
+# Slice renders run in worker threads, so IMAGE_CACHE is only touched under this lock.
+_IMAGE_CACHE_LOCK = threading.Lock()
+# Decoded axial slices keyed by (analysis_id, slice, volume), shared by the
+# per-layer renders so the eat layer reuses the CT/pericardium reads.
+SLICE_CACHE_LIMIT = 24
+SLICE_CACHE: OrderedDict[tuple[str, int, str], dict[str, object]] = OrderedDict()
+_SLICE_CACHE_LOCK = threading.Lock()
+
+# Copy buffer for writing uploaded CTs to disk (shutil's default is 64 KiB).
+UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Slice PNGs are transient data URLs, so favour encode speed over size.
+PNG_COMPRESS_LEVEL = 1
+
+# Overlay layers served by /api/slice, and the colour of each mask layer.
+SLICE_LAYERS = ("ct", "pericardium", "eat", "myocardium")
+SLICE_LAYER_COLORS = {
+    "pericardium": (34, 197, 94),
+    "eat": (239, 68, 68),
+    "myocardium": (99, 102, 241),
+}
+
+# Batch items run in a process pool; each worker's TotalSegmentator gets an
+# equal share of the CPU threads. GPU batches run one item at a time so
+# concurrent segmentations do not exhaust the memory of a single card.
+BATCH_MAX_WORKERS = max(1, min(4, (os.cpu_count() or 1) // 4))
+BATCH_GPU_MAX_WORKERS = 1
+_BATCH_EXECUTORS: dict[str, ProcessPoolExecutor] = {}
+
+# 1 HU bins covering the usual CT range, used for percentile windowing.
+HU_HIST_MIN = -1024
+HU_HIST_BINS = 4096
+# Approximate number of CT voxels sampled to pick the per-analysis display window.
+CT_WINDOW_SAMPLE_SIZE = 1_000_000
+# Soft-tissue window (W400/L40) used when the CT cannot be sampled.
+CT_DEFAULT_WINDOW = (-160.0, 240.0)
 
 _ID_SAFE_PATTERN = re.compile(r"[^A-Za-z0-9._-]+")
 
@@ -113,60 +165,328 @@ def _write_batch_stats_csv(csv_path: Path, rows: list[dict[str, object]]) -> Non
                 "High_HU",
             ]
         )
-        for row in rows:
-            writer.writerow(
-                [
-                    row.get("participant_id", ""),
-                    row.get("ct_path", ""),
-                    row.get("pericardium_path", ""),
-                    row.get("eat_mask_path", ""),
-                    "{:.3f}".format(float(row.get("eat_volume", 0.0))),
-                    "{:.3f}".format(float(row.get("mean_hu", 0.0))),
-                    "{:.3f}".format(float(row.get("std_hu", 0.0))),
-                    "" if row.get("ff_myocardium", None) is None else "{:.6f}".format(float(row.get("ff_myocardium", 0.0))),
-                    row.get("low_hu", ""),
-                    row.get("high_hu", ""),
-                ]
+        writer.writerows(
+            (
+                row.get("participant_id", ""),
+                row.get("ct_path", ""),
+                row.get("pericardium_path", ""),
+                row.get("eat_mask_path", ""),
+                "%.3f" % float(row.get("eat_volume", 0.0)),
+                "%.3f" % float(row.get("mean_hu", 0.0)),
+                "%.3f" % float(row.get("std_hu", 0.0)),
+                "" if row.get("ff_myocardium", None) is None else "%.6f" % float(row["ff_myocardium"]),
+                row.get("low_hu", ""),
+                row.get("high_hu", ""),
             )
+            for row in rows
+        )
+
+
+def _save_upload(file: UploadFile, path: Path) -> None:
+    with path.open("wb") as handle:
+        shutil.copyfileobj(file.file, handle, length=UPLOAD_CHUNK_SIZE)
+
+
+def _cache_analysis(analysis_id: str, analysis: dict[str, object]) -> None:
+    ANALYSIS_CACHE[analysis_id] = analysis
+    ANALYSIS_CACHE.move_to_end(analysis_id)
+    while len(ANALYSIS_CACHE) > ANALYSIS_CACHE_LIMIT:
+        evicted_id, _ = ANALYSIS_CACHE.popitem(last=False)
+        with _IMAGE_CACHE_LOCK:
+            IMAGE_CACHE.pop(evicted_id, None)
+        with _SLICE_CACHE_LOCK:
+            for key in [key for key in SLICE_CACHE if key[0] == evicted_id]:
+                del SLICE_CACHE[key]
 
 
 def _analysis_or_404(analysis_id: str) -> dict[str, object]:
     analysis = ANALYSIS_CACHE.get(analysis_id)
     if not analysis:
         raise HTTPException(status_code=404, detail="Analysis not found. Run analysis again.")
+    ANALYSIS_CACHE.move_to_end(analysis_id)
     return analysis
 
 
-def _normalize_ct_slice(slice_data: np.ndarray) -> np.ndarray:
-    data = np.asarray(slice_data, dtype=np.float32)
-    finite = data[np.isfinite(data)]
-    if finite.size == 0:
-        return np.zeros(data.shape, dtype=np.uint8)
-    vmin = float(np.percentile(finite, 1))
-    vmax = float(np.percentile(finite, 99))
+def _analysis_images(analysis_id: str, analysis: dict[str, object]) -> dict[str, object]:
+    with _IMAGE_CACHE_LOCK:
+        images = IMAGE_CACHE.get(analysis_id)
+        if images is not None:
+            IMAGE_CACHE.move_to_end(analysis_id)
+            return images
+
+        # Prefer high-res myocardium mask if available
+        myo_path = analysis.get("myocardium_highres_path") or analysis.get("myocardium_path")
+        myo_img = None
+        if myo_path:
+            try:
+                myo_img = nib.load(str(myo_path), mmap=False)
+            except Exception:
+                myo_img = None
+
+        images = {
+            "ct": nib.load(str(analysis["ct_path"]), mmap=False),
+            "pericardium": nib.load(str(analysis["pericardium_path"]), mmap=False),
+            "myocardium": myo_img,
+        }
+        IMAGE_CACHE[analysis_id] = images
+        while len(IMAGE_CACHE) > IMAGE_CACHE_LIMIT:
+            IMAGE_CACHE.popitem(last=False)
+        return images
+
+
+def _hu_percentiles(values: np.ndarray, low_pct: float, high_pct: float) -> tuple[float, float]:
+    """Approximate two percentiles of HU `values` from a 1 HU histogram.
+
+    Values are clipped to the CT range [-1024, 3071], so this is a single
+    linear pass with no sort, unlike `np.percentile`.
+    """
+    bins = np.clip(values, HU_HIST_MIN, HU_HIST_MIN + HU_HIST_BINS - 1).astype(np.int32, copy=False)
+    bins -= HU_HIST_MIN
+    cdf = np.cumsum(np.bincount(bins.ravel(), minlength=HU_HIST_BINS))
+    total = cdf[-1]
+    low_bin, high_bin = np.searchsorted(cdf, [total * low_pct / 100.0, total * high_pct / 100.0])
+    return float(low_bin + HU_HIST_MIN), float(high_bin + HU_HIST_MIN)
+
+
+def _ct_display_window(values: np.ndarray) -> tuple[float, float]:
+    """Return the (1st, 99th) percentile display window of CT `values`."""
+    values = np.asarray(values)
+    if values.dtype.kind == "f":
+        finite = np.isfinite(values)
+        if not finite.all():
+            values = values[finite]
+    if values.size == 0:
+        return 0.0, 1.0
+    vmin, vmax = _hu_percentiles(values, 1, 99)
     if vmin == vmax:
-        vmin = float(finite.min())
-        vmax = float(finite.max())
+        vmin = float(values.min())
+        vmax = float(values.max())
         if vmin == vmax:
             vmax = vmin + 1.0
-    scaled = (np.clip(data, vmin, vmax) - vmin) / (vmax - vmin)
-    return (scaled * 255).astype(np.uint8)
+    return vmin, vmax
+
+
+def _sample_ct_window(ct_img: nib.Nifti1Image) -> tuple[float, float]:
+    """Display window for a whole CT, estimated from a strided voxel sample.
+
+    Using one window per volume keeps brightness stable while scrolling and
+    spares every slice request its own percentile pass. The window is only
+    cosmetic, so a CT that cannot be sampled falls back to CT_DEFAULT_WINDOW.
+    """
+    try:
+        stride = max(1, int(np.ceil((np.prod(ct_img.shape) / CT_WINDOW_SAMPLE_SIZE) ** (1.0 / 3.0))))
+        return _ct_display_window(np.asanyarray(ct_img.dataobj[::stride, ::stride, ::stride]))
+    except Exception:
+        return CT_DEFAULT_WINDOW
+
 
+def _normalize_ct_slice(slice_data: np.ndarray, vmin: float, vmax: float) -> np.ndarray:
+    # Rescale in one float32 working buffer, then cast once into the output.
+    data = np.array(slice_data, dtype=np.float32)
+    np.clip(data, vmin, vmax, out=data)
+    data -= vmin
+    data *= 255.0 / (vmax - vmin)
+    np.rint(data, out=data)
+    out = np.empty(data.shape, dtype=np.uint8)
+    np.copyto(out, data, casting="unsafe")
+    return out
 
-def _png_data_url(image: Image.Image) -> str:
+
+def _png_bytes(image: Image.Image, **save_options: object) -> bytes:
     buffer = BytesIO()
-    image.save(buffer, format="PNG")
-    encoded = base64.b64encode(buffer.getvalue()).decode("ascii")
+    image.save(buffer, format="PNG", optimize=False, compress_level=PNG_COMPRESS_LEVEL, **save_options)
+    return buffer.getvalue()
+
+
+def _png_data_url(png: bytes) -> str:
+    encoded = base64.b64encode(png).decode("ascii")
     return f"data:image/png;base64,{encoded}"
 
 
-def _mask_png(mask: np.ndarray, color: tuple[int, int, int]) -> str:
-    rgba = np.zeros((*mask.shape, 4), dtype=np.uint8)
-    rgba[..., 0] = color[0]
-    rgba[..., 1] = color[1]
-    rgba[..., 2] = color[2]
-    rgba[..., 3] = (mask > 0).astype(np.uint8) * 255
-    return _png_data_url(Image.fromarray(rgba, mode="RGBA"))
+def _mask_png(mask: np.ndarray, color: tuple[int, int, int]) -> bytes:
+    # Two-colour palette PNG: index 0 is transparent, index 1 is `color`.
+    indices = np.greater(mask, 0).view(np.uint8)
+    image = Image.fromarray(indices, mode="L")
+    image.putpalette([0, 0, 0, color[0], color[1], color[2]])
+    return _png_bytes(image, transparency=0)
+
+
+def _check_slice_index(analysis: dict[str, object], slice: int) -> int:
+    total_slices = int(analysis["total_slices"])
+    if slice < 0 or slice >= total_slices:
+        raise HTTPException(status_code=400, detail="Slice index out of range.")
+    return total_slices
+
+
+def _slice_array(
+    analysis_id: str, analysis: dict[str, object], slice: int, volume: str
+) -> Optional[np.ndarray]:
+    """Return one axial slice of `volume`, reading it at most once per cache entry."""
+    key = (analysis_id, slice, volume)
+    with _SLICE_CACHE_LOCK:
+        entry = SLICE_CACHE.get(key)
+        if entry is None:
+            entry = {"lock": threading.Lock(), "loaded": False, "data": None}
+            SLICE_CACHE[key] = entry
+            while len(SLICE_CACHE) > SLICE_CACHE_LIMIT:
+                SLICE_CACHE.popitem(last=False)
+        else:
+            SLICE_CACHE.move_to_end(key)
+
+    # Concurrent layer renders of the same slice wait here for the first read.
+    with entry["lock"]:
+        if not entry["loaded"]:
+            img = _analysis_images(analysis_id, analysis)[volume]
+            entry["data"] = None if img is None else np.asarray(img.dataobj[:, :, slice])
+            entry["loaded"] = True
+        return entry["data"]
+
+
+def _render_slice_layer(
+    analysis_id: str, analysis: dict[str, object], slice: int, layer: str
+) -> Optional[bytes]:
+    """Render one layer of an axial slice as PNG bytes.
+
+    Returns None for the myocardium layer when no myocardium mask is available.
+    """
+    if layer == "ct":
+        ct_slice = _slice_array(analysis_id, analysis, slice, "ct")
+        normalized = _normalize_ct_slice(ct_slice, float(analysis["ct_vmin"]), float(analysis["ct_vmax"]))
+        return _png_bytes(Image.fromarray(normalized, mode="L"))
+
+    if layer == "myocardium":
+        try:
+            myo_slice = _slice_array(analysis_id, analysis, slice, "myocardium")
+        except Exception:
+            return None
+        if myo_slice is None:
+            return None
+        mask = myo_slice > 0
+    else:
+        mask = _slice_array(analysis_id, analysis, slice, "pericardium") > 0
+        if layer == "eat":
+            ct_slice = _slice_array(analysis_id, analysis, slice, "ct")
+            mask = np.logical_and(
+                mask,
+                np.logical_and(ct_slice >= analysis["hu_low"], ct_slice <= analysis["hu_high"]),
+            )
+    return _mask_png(mask, SLICE_LAYER_COLORS[layer])
+
+
+def _render_slice(analysis_id: str, analysis: dict[str, object], slice: int) -> dict[str, Optional[str]]:
+    pngs = {layer: _render_slice_layer(analysis_id, analysis, slice, layer) for layer in SLICE_LAYERS}
+    return {layer: _png_data_url(png) if png is not None else None for layer, png in pngs.items()}
+
+
+def _batch_pool_kind(device: str) -> str:
+    return "cpu" if device == "cpu" else "gpu"
+
+
+def _batch_workers(device: str) -> int:
+    return BATCH_MAX_WORKERS if _batch_pool_kind(device) == "cpu" else BATCH_GPU_MAX_WORKERS
+
+
+def _batch_threads_per_worker(device: str) -> int:
+    return max(1, (os.cpu_count() or 1) // _batch_workers(device))
+
+
+def _batch_executor(device: str) -> ProcessPoolExecutor:
+    kind = _batch_pool_kind(device)
+    executor = _BATCH_EXECUTORS.get(kind)
+    if executor is None:
+        # Spawn rather than fork: the server process already runs threads
+        # (asyncio.to_thread slice renders) that a forked child would inherit
+        # in an undefined state.
+        executor = ProcessPoolExecutor(
+            max_workers=_batch_workers(device),
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        _BATCH_EXECUTORS[kind] = executor
+    return executor
+
+
+def _reset_batch_executor(device: str) -> None:
+    """Drop a broken pool (e.g. a worker was OOM-killed) so the next use recreates it."""
+    executor = _BATCH_EXECUTORS.pop(_batch_pool_kind(device), None)
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def _submit_batch_item(loop: asyncio.AbstractEventLoop, device: str, *args: object) -> asyncio.Future:
+    try:
+        return loop.run_in_executor(_batch_executor(device), _process_batch_item, *args)
+    except BrokenProcessPool:
+        _reset_batch_executor(device)
+        return loop.run_in_executor(_batch_executor(device), _process_batch_item, *args)
+
+
+def _process_batch_item(
+    ct_path: str,
+    participant_dir: str,
+    hu_low: float,
+    hu_high: float,
+    device: str,
+    save_eat_mask: bool,
+    num_threads: int,
+) -> dict[str, object]:
+    """Segment one uploaded CT and compute its outputs (runs in a pool worker)."""
+    # Keep the EAT kernel to this worker's share of the cores
+    set_num_threads(num_threads)
+
+    # Pericardium (EAT) segmentation
+    pericardium_path, _ = run_totalsegmentation(
+        ct_path, participant_dir, device=device, num_threads=num_threads
+    )
+    results = compute_eat_and_stats(
+        ct_path,
+        pericardium_path,
+        low_hu=hu_low,
+        high_hu=hu_high,
+        return_arrays=False,
+        return_eat_mask=save_eat_mask,
+        device=device,
+    )
+
+    # High-res myocardium segmentation and FF computation
+    ff_myocardium = None
+    try:
+        myocardium_highres = run_totalsegmentation_task(
+            ct_path, participant_dir, "heartchambers_highres", device=device, num_threads=num_threads
+        )
+        ff_myocardium = compute_myocardium_ff(ct_path, myocardium_highres, hu_low, hu_high)
+    except Exception:
+        ff_myocardium = None
+
+    stats_csv = save_stats_csv(
+        participant_dir,
+        ct_path,
+        pericardium_path,
+        hu_low,
+        hu_high,
+        eat_volume=results["eat_volume"],
+        mean_hu=results["mean_hu"],
+        std_hu=results["std_hu"],
+        ff_myocardium=ff_myocardium,
+    )
+    eat_mask_path = None
+    if save_eat_mask:
+        eat_mask_path = save_eat_mask_nifti(
+            participant_dir,
+            results["ct_img"],
+            results["eat_mask_uint8"],
+            hu_low,
+            hu_high,
+        )
+
+    return {
+        "pericardium_path": pericardium_path,
+        "eat_mask_path": eat_mask_path,
+        "stats_csv": stats_csv,
+        "eat_volume": results["eat_volume"],
+        "mean_hu": results["mean_hu"],
+        "std_hu": results["std_hu"],
+        "ff_myocardium": ff_myocardium,
+    }
 
 
 @app.get("/api/health")
@@ -193,8 +513,7 @@ async def analyze(
 
     ct_path = output_dir / file.filename
     try:
-        with ct_path.open("wb") as handle:
-            shutil.copyfileobj(file.file, handle)
+        _save_upload(file, ct_path)
 
         # Run the default segmentation to obtain pericardium (used for EAT)
         pericardium_path, _ = run_totalsegmentation(str(ct_path), str(output_dir), device=device)
@@ -206,6 +525,8 @@ async def analyze(
             low_hu=hu_low,
             high_hu=hu_high,
             return_arrays=False,
+            return_eat_mask=save_eat_mask,
+            device=device,
         )
 
         # Run a separate high-res segmentation for myocardium and compute FF
@@ -232,8 +553,8 @@ async def analyze(
         if save_eat_mask:
             save_eat_mask_nifti(
                 str(output_dir),
-                str(ct_path),
-                pericardium_path,
+                results["ct_img"],
+                results["eat_mask_uint8"],
                 hu_low,
                 hu_high,
             )
@@ -242,16 +563,23 @@ async def analyze(
     finally:
         file.file.close()
 
+    ct_vmin, ct_vmax = _sample_ct_window(results["ct_img"])
+
     analysis_id = uuid4().hex
-    ANALYSIS_CACHE[analysis_id] = {
-        "ct_path": str(ct_path),
-        "pericardium_path": pericardium_path,
-        "myocardium_highres_path": myocardium_highres,
-        "hu_low": hu_low,
-        "hu_high": hu_high,
-        "total_slices": results["total_slices"],
-        "ff_myocardium": ff_myocardium,
-    }
+    _cache_analysis(
+        analysis_id,
+        {
+            "ct_path": str(ct_path),
+            "pericardium_path": pericardium_path,
+            "myocardium_highres_path": myocardium_highres,
+            "hu_low": hu_low,
+            "hu_high": hu_high,
+            "total_slices": results["total_slices"],
+            "ff_myocardium": ff_myocardium,
+            "ct_vmin": ct_vmin,
+            "ct_vmax": ct_vmax,
+        },
+    )
 
     return {
         "success": True,
@@ -292,6 +620,9 @@ async def analyze_batch(
     items: list[dict[str, object]] = []
     csv_rows: list[dict[str, object]] = []
 
+    # Uploads are written sequentially; the slow per-file work (segmentation
+    # and statistics) then runs in parallel in the batch process pool.
+    jobs: list[dict[str, object]] = []
     for file in files:
         if not file.filename:
             items.append(
@@ -310,106 +641,81 @@ async def analyze_batch(
         )
         participant_dir.mkdir(parents=True, exist_ok=True)
         ct_path = participant_dir / Path(file.filename).name
+        item = {
+            "participantId": participant_id,
+            "participantIdSource": participant_source,
+            "participantFolder": participant_folder,
+            "inputFile": file.filename,
+            "ctPath": str(ct_path),
+            "outputDir": str(participant_dir),
+        }
 
         try:
-            with ct_path.open("wb") as handle:
-                shutil.copyfileobj(file.file, handle)
+            _save_upload(file, ct_path)
+        except Exception as exc:
+            items.append({**item, "status": "error", "error": str(exc)})
+            continue
+        finally:
+            file.file.close()
 
-            # Pericardium (EAT) segmentation
-            pericardium_path, _ = run_totalsegmentation(
-                str(ct_path), str(participant_dir), device=device
-            )
-            results = compute_eat_and_stats(
-                str(ct_path),
-                pericardium_path,
-                low_hu=hu_low,
-                high_hu=hu_high,
-                return_arrays=False,
-            )
+        items.append(item)
+        jobs.append(item)
 
-            # High-res myocardium segmentation and FF computation
-            myocardium_highres = None
-            ff_myocardium = None
-            try:
-                myocardium_highres = run_totalsegmentation_task(str(ct_path), str(participant_dir), "heartchambers_highres", device=device)
-                ff_myocardium = compute_myocardium_ff(str(ct_path), myocardium_highres, hu_low, hu_high)
-            except Exception:
-                myocardium_highres = None
-                ff_myocardium = None
+    loop = asyncio.get_running_loop()
+    futures = [
+        _submit_batch_item(
+            loop,
+            device,
+            str(item["ctPath"]),
+            str(item["outputDir"]),
+            hu_low,
+            hu_high,
+            device,
+            save_eat_mask,
+            _batch_threads_per_worker(device),
+        )
+        for item in jobs
+    ]
+    outcomes = await asyncio.gather(*futures, return_exceptions=True)
+    if any(isinstance(outcome, BrokenProcessPool) for outcome in outcomes):
+        # A worker died mid-batch; those items are reported as errors and the
+        # next batch gets a fresh pool.
+        _reset_batch_executor(device)
+
+    for item, outcome in zip(jobs, outcomes):
+        if isinstance(outcome, BaseException):
+            item["status"] = "error"
+            item["error"] = str(outcome)
+            continue
 
-            stats_csv = save_stats_csv(
-                str(participant_dir),
-                str(ct_path),
-                pericardium_path,
-                hu_low,
-                hu_high,
-                eat_volume=results["eat_volume"],
-                mean_hu=results["mean_hu"],
-                std_hu=results["std_hu"],
-                ff_myocardium=ff_myocardium,
-            )
-            eat_mask_path = None
-            if save_eat_mask:
-                eat_mask_path = save_eat_mask_nifti(
-                    str(participant_dir),
-                    str(ct_path),
-                    pericardium_path,
-                    hu_low,
-                    hu_high,
-                )
-
-            item = {
-                "participantId": participant_id,
-                "participantIdSource": participant_source,
-                "participantFolder": participant_folder,
-                "inputFile": file.filename,
-                "ctPath": str(ct_path),
-                "outputDir": str(participant_dir),
-                "status": "success",
-                "outputs": {
-                    "pericardium": pericardium_path,
-                    "eatMask": eat_mask_path,
-                    "statsCsv": stats_csv,
-                },
-                "stats": {
-                    "eatVolume": results["eat_volume"],
-                    "meanHU": results["mean_hu"],
-                    "stdHU": results["std_hu"],
-                    "ffMyocardium": ff_myocardium,
-                    "lowHU": hu_low,
-                    "highHU": hu_high,
-                },
+        item["status"] = "success"
+        item["outputs"] = {
+            "pericardium": outcome["pericardium_path"],
+            "eatMask": outcome["eat_mask_path"],
+            "statsCsv": outcome["stats_csv"],
+        }
+        item["stats"] = {
+            "eatVolume": outcome["eat_volume"],
+            "meanHU": outcome["mean_hu"],
+            "stdHU": outcome["std_hu"],
+            "ffMyocardium": outcome["ff_myocardium"],
+            "lowHU": hu_low,
+            "highHU": hu_high,
+        }
+        csv_rows.append(
+            {
+                "participant_id": item["participantId"],
+                "ct_path": item["ctPath"],
+                "pericardium_path": outcome["pericardium_path"],
+                "eat_mask_path": outcome["eat_mask_path"] or "",
+                "eat_volume": outcome["eat_volume"],
+                "mean_hu": outcome["mean_hu"],
+                "std_hu": outcome["std_hu"],
+                "ff_myocardium": outcome["ff_myocardium"],
+                "low_hu": hu_low,
+                "high_hu": hu_high,
             }
-            items.append(item)
-            csv_rows.append(
-                {
-                    "participant_id": participant_id,
-                    "ct_path": str(ct_path),
-                    "pericardium_path": pericardium_path,
-                    "eat_mask_path": eat_mask_path or "",
-                    "eat_volume": results["eat_volume"],
-                    "mean_hu": results["mean_hu"],
-                    "std_hu": results["std_hu"],
-                    "ff_myocardium": ff_myocardium,
-                    "low_hu": hu_low,
-                    "high_hu": hu_high,
-                }
-            )
-        except Exception as exc:
-            items.append(
-                {
-                    "participantId": participant_id,
-                    "participantIdSource": participant_source,
-                    "participantFolder": participant_folder,
-                    "inputFile": file.filename,
-                    "ctPath": str(ct_path),
-                    "outputDir": str(participant_dir),
-                    "status": "error",
-                    "error": str(exc),
-                }
-            )
-        finally:
-            file.file.close()
+        )
 
     succeeded = sum(1 for item in items if item.get("status") == "success")
     failed = sum(1 for item in items if item.get("status") == "error")
@@ -457,49 +763,29 @@ async def analyze_batch(
 
 
 @app.get("/api/slice")
-def get_slice(analysis_id: str, slice: int) -> dict:
+async def get_slice(analysis_id: str, slice: int) -> dict:
     analysis = _analysis_or_404(analysis_id)
-    total_slices = int(analysis["total_slices"])
-    if slice < 0 or slice >= total_slices:
-        raise HTTPException(status_code=400, detail="Slice index out of range.")
-
-    ct_img = nib.load(str(analysis["ct_path"]))
-    peri_img = nib.load(str(analysis["pericardium_path"]))
-    # Prefer high-res myocardium mask if available
-    myo_path = analysis.get("myocardium_highres_path") or analysis.get("myocardium_path")
-    myo_img = None
-    if myo_path:
-        try:
-            myo_img = nib.load(str(myo_path))
-        except Exception:
-            myo_img = None
-
-    ct_slice = np.asarray(ct_img.dataobj[:, :, slice])
-    peri_slice = np.asarray(peri_img.dataobj[:, :, slice]) > 0
-    eat_slice = np.logical_and(
-        peri_slice,
-        np.logical_and(ct_slice >= analysis["hu_low"], ct_slice <= analysis["hu_high"]),
-    )
-    myo_slice = None
-    if myo_img is not None:
-        try:
-            myo_slice = np.asarray(myo_img.dataobj[:, :, slice]) > 0
-        except Exception:
-            myo_slice = None
-
-    ct_png = _png_data_url(Image.fromarray(_normalize_ct_slice(ct_slice), mode="L"))
-    pericardium_png = _mask_png(peri_slice, (34, 197, 94))
-    eat_png = _mask_png(eat_slice, (239, 68, 68))
-    myocardium_png = None
-    if myo_slice is not None:
-        myocardium_png = _mask_png(myo_slice, (99, 102, 241))
+    total_slices = _check_slice_index(analysis, slice)
+    data_urls = await asyncio.to_thread(_render_slice, analysis_id, analysis, slice)
 
     return {
         "slice": slice,
         "totalSlices": total_slices,
-        "ctPng": ct_png,
-        "pericardiumPng": pericardium_png,
-        "eatPng": eat_png,
-        "myocardiumPng": myocardium_png,
+        "ctPng": data_urls["ct"],
+        "pericardiumPng": data_urls["pericardium"],
+        "eatPng": data_urls["eat"],
+        "myocardiumPng": data_urls["myocardium"],
     }
 
+
+@app.get("/api/slice/{layer}")
+async def get_slice_layer(layer: str, analysis_id: str, slice: int) -> Response:
+    if layer not in SLICE_LAYERS:
+        raise HTTPException(status_code=404, detail="Unknown slice layer.")
+    analysis = _analysis_or_404(analysis_id)
+    _check_slice_index(analysis, slice)
+    png = await asyncio.to_thread(_render_slice_layer, analysis_id, analysis, slice, layer)
+    if png is None:
+        # Optional layer (myocardium) not available for this analysis.
+        return Response(status_code=204)
+    return Response(content=png, media_type="image/png")
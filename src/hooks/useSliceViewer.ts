@@ -16,14 +16,6 @@ interface UseSliceViewerReturn {
   canvasRef: React.RefObject<HTMLCanvasElement>;
 }
 
-interface SliceImagesResponse {
-  ctPng: string;
-  eatPng: string;
-  pericardiumPng: string;
-  slice: number;
-  totalSlices: number;
-}
-
 type SliceImageSet = {
   ct: HTMLImageElement;
   eat: HTMLImageElement;
@@ -158,6 +150,35 @@ function createEmptyImage(): Promise<HTMLImageElement> {
   });
 }
 
+// Fetch one layer of a slice as a raw PNG. Optional layers answer 204 when
+// the analysis has no data for them and are drawn as an empty image.
+async function fetchLayerImage(
+  layer: 'ct' | 'eat' | 'pericardium' | 'myocardium',
+  query: string,
+  signal?: AbortSignal
+): Promise<HTMLImageElement> {
+  const response = await fetch(`${API_BASE_URL}/api/slice/${layer}?${query}`, { signal });
+  if (response.status === 204) {
+    return createEmptyImage();
+  }
+  if (!response.ok) {
+    let txt = '';
+    try {
+      txt = await response.text();
+    } catch (_) {
+      txt = '';
+    }
+    throw new Error(`Failed to fetch ${layer} slice: ${response.status} ${response.statusText} ${txt}`);
+  }
+
+  const url = URL.createObjectURL(await response.blob());
+  try {
+    return await loadImage(url);
+  } finally {
+    URL.revokeObjectURL(url);
+  }
+}
+
 function drawRotatedImage(
   ctx: CanvasRenderingContext2D,
   img: HTMLImageElement,
@@ -230,27 +251,13 @@ export function useSliceViewer(initialTotalSlices = 120): UseSliceViewerReturn {
     analysisIdValue: string,
     signal?: AbortSignal
   ) => {
-    const response = await fetch(
-      `${API_BASE_URL}/api/slice?analysis_id=${encodeURIComponent(analysisIdValue)}&slice=${sliceIndex}`,
-      { signal }
-    );
-    if (!response.ok) {
-      let txt = '';
-      try {
-        txt = await response.text();
-      } catch (_) {
-        txt = '';
-      }
-      throw new Error(`Failed to fetch slice data: ${response.status} ${response.statusText} ${txt}`);
-    }
-
-    const data = (await response.json()) as SliceImagesResponse & { myocardiumPng?: string | null };
-    const ctP = loadImage(data.ctPng);
-    const eatP = loadImage(data.eatPng);
-    const periP = loadImage(data.pericardiumPng);
-    const myoP = data.myocardiumPng ? loadImage(data.myocardiumPng) : createEmptyImage();
-
-    const [ct, eat, pericardium, myocardium] = await Promise.all([ctP, eatP, periP, myoP]);
+    const query = `analysis_id=${encodeURIComponent(analysisIdValue)}&slice=${sliceIndex}`;
+    const [ct, eat, pericardium, myocardium] = await Promise.all([
+      fetchLayerImage('ct', query, signal),
+      fetchLayerImage('eat', query, signal),
+      fetchLayerImage('pericardium', query, signal),
+      fetchLayerImage('myocardium', query, signal),
+    ]);
 
     return { ct, eat, pericardium, myocardium };
   }, []);